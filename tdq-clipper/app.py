@@ -1,6 +1,11 @@
-from flask import Flask, request, jsonify
-import subprocess, os, uuid, glob, shutil, time, re, traceback
-import subprocess, os, uuid, glob, shutil, time, re
+from flask import Flask, Response, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import subprocess, os, uuid, glob, shutil, time, re, traceback, threading, json, resource, hashlib, gzip, html
+import requests
+import yt_dlp
 
 app = Flask(__name__)
 
@@ -9,8 +14,8 @@ SUB_DIR = "/data/subs"
 FINAL_DIR = "/data/final"
 N8N_FINAL_DIR = "/n8n-files/final"
 LOCK_DIR = "/data/locks"
-COOKIES = "/data/cookies.txt"
 COOKIES = "/data/cookies.txt"  # optionnel
+PROFILE_LOG = os.environ.get("PROFILE_LOG", "/data/profile.jsonl")
 
 os.makedirs(RAW_DIR, exist_ok=True)
 os.makedirs(SUB_DIR, exist_ok=True)
@@ -18,15 +23,46 @@ os.makedirs(FINAL_DIR, exist_ok=True)
 os.makedirs(N8N_FINAL_DIR, exist_ok=True)
 os.makedirs(LOCK_DIR, exist_ok=True)
 
+# ---- Async jobs: requests with a callbackUrl are answered at once (202)
+# and the result is POSTed back to n8n when the work is done.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+CALLBACK_TIMEOUT = (5, 30)  # (connect, read) seconds
+CALLBACK_RETRIES = int(os.environ.get("CALLBACK_RETRIES", "5"))
+CALLBACK_BACKOFF = 2.0      # 0s, 4s, 8s, 16s... between attempts
 
-@app.errorhandler(Exception)
-def handle_exception(err):
-    return jsonify({
+_jobs = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_callback_session = None
+_callback_session_lock = threading.Lock()
+
+# ---- Per-job resource accounting: every child process (yt-dlp, ffmpeg) is
+# reaped with wait4() so we get its own rusage, not the whole server's.
+_job_ctx = threading.local()
+_profile_log_lock = threading.Lock()
+
+# ---- Transcripts
+TRANSCRIPT_LANGS = ["fr", "en"]
+TRANSCRIPT_PAGE_LIMIT = 500
+TRANSCRIPT_MAX_PAGE_LIMIT = 5000
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+LANG_RE = re.compile(r"^[A-Za-z]{2,3}(-[A-Za-z0-9]{2,8})*$")
+
+# ---- Batch transcripts (/transcript/batch)
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "2"))
+BATCH_MAX_CONCURRENCY = 4
+
+
+def error_payload(err):
+    return {
         "ok": False,
         "step": "unhandled",
         "error": str(err),
         "traceback": traceback.format_exc(),
-    }), 500
+    }
+
+
+@app.errorhandler(Exception)
+def handle_exception(err):
+    return jsonify(error_payload(err)), 500
 
 # ---- Subtitle styling defaults (9:16 1080x1920)
 FONT_NAME = "DejaVu Sans"
@@ -48,10 +84,91 @@ OUTLINE_COLOUR = "&H80000000"  # noir semi
 TS_RE = re.compile(r"(\d{2}):(\d{2}):(\d{2})\.(\d{3})")
 INLINE_TS_RE = re.compile(r"<(\d{2}:\d{2}:\d{2}\.\d{3})>")
 TAG_RE = re.compile(r"</?c[^>]*>")
+FFMPEG_TIME_RE = re.compile(r"time=\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)")
 
 def run(cmd):
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return p.returncode, p.stdout, p.stderr
+    t0 = time.monotonic()
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # drain both pipes ourselves: communicate() would reap the child and lose its rusage
+    out, err = [], []
+    readers = [
+        threading.Thread(target=lambda f, buf: buf.append(f.read()), args=(p.stdout, out)),
+        threading.Thread(target=lambda f, buf: buf.append(f.read()), args=(p.stderr, err)),
+    ]
+    for t in readers:
+        t.start()
+    for t in readers:
+        t.join()
+    p.stdout.close()
+    p.stderr.close()
+
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    record_process(cmd, p.returncode, time.monotonic() - t0, ru)
+    return p.returncode, "".join(out), "".join(err)
+
+
+def append_profile_log(entry: dict):
+    try:
+        line = json.dumps(entry, ensure_ascii=False)
+        with _profile_log_lock:
+            with open(PROFILE_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        app.logger.warning("profile log %s: %s", PROFILE_LOG, e)
+
+
+def record_process(cmd, returncode: int, wall_sec: float, ru):
+    entry = {
+        "tool": os.path.basename(cmd[0]),
+        "returncode": returncode,
+        "wallSec": round(wall_sec, 3),
+        "userSec": round(ru.ru_utime, 3),
+        "sysSec": round(ru.ru_stime, 3),
+        "maxRssKb": ru.ru_maxrss,       # Linux: kilobytes
+        "inBlocks": ru.ru_inblock,      # 512-byte blocks
+        "outBlocks": ru.ru_oublock,
+    }
+    procs = getattr(_job_ctx, "procs", None)
+    if procs is not None:
+        procs.append(entry)
+    meta = getattr(_job_ctx, "meta", {})
+    append_profile_log({"ts": time.time(), "kind": "process", **meta, **entry})
+
+
+def profile_summary(procs: list, wall_sec: float) -> dict:
+    # thread records have no maxRssKb (RUSAGE_THREAD reports the whole server's peak)
+    rss = [p["maxRssKb"] for p in procs if "maxRssKb" in p]
+    return {
+        "wallSec": round(wall_sec, 3),
+        "userSec": round(sum(p["userSec"] for p in procs), 3),
+        "sysSec": round(sum(p["sysSec"] for p in procs), 3),
+        "maxRssKb": max(rss) if rss else None,
+        "inBlocks": sum(p["inBlocks"] for p in procs),
+        "outBlocks": sum(p["outBlocks"] for p in procs),
+        "processes": procs,
+    }
+
+
+def append_job_log(meta: dict, ok: bool, output_sec, resources: dict):
+    summary = {k: v for k, v in resources.items() if k != "processes"}
+    append_profile_log({
+        "ts": time.time(), "kind": "job", **meta,
+        "ok": ok,
+        "outputSec": output_sec,
+        "processCount": len(resources["processes"]),
+        **summary,
+    })
+
+
+def ffmpeg_output_sec(stderr: str):
+    """Length actually written, from ffmpeg's last progress "time=" (None if absent)."""
+    m = FFMPEG_TIME_RE.findall(stderr or "")
+    if not m:
+        return None
+    h, mi, s = m[-1]
+    return round(int(h) * 3600 + int(mi) * 60 + float(s), 3)
 
 
 def is_429(stderr: str) -> bool:
@@ -75,11 +192,6 @@ def acquire_lock(name: str, timeout_sec: int = 600, stale_sec: int = 900):
                     os.remove(lock_path)
             except Exception:
                 pass
-
-def acquire_lock(name: str, timeout_sec: int = 180):
-    lock_path = os.path.join(LOCK_DIR, f"{name}.lock")
-    start = time.time()
-    while True:
         try:
             fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
             os.write(fd, str(os.getpid()).encode("utf-8"))
@@ -123,49 +235,17 @@ def parse_hmsms(s: str) -> int:
         raise ValueError(f"invalid time format: {s}")
     return hmsms_to_ms(*m.groups())
 
-def ms_to_hmsms(ms: int) -> str:
-    ms = max(0, int(ms))
-    total = ms // 1000
-    h = total // 3600
-    m = (total % 3600) // 60
-    s = total % 60
-    r = ms % 1000
-    return f"{h:02d}:{m:02d}:{s:02d}.{r:03d}"
-                raise RuntimeError(f"lock timeout for {name}")
-            time.sleep(0.4)
-
-
-def release_lock(lock_path: str):
-    try:
-        os.remove(lock_path)
-    except:
-        pass
-
 
-def yt_dlp_common_args():
-    args = [
-        "--retries", "10",
-        "--fragment-retries", "10",
-        "--concurrent-fragments", "1",
-        "--sleep-interval", "1",
-        "--max-sleep-interval", "3",
-        "--user-agent",
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "--extractor-args", "youtube:player_client=android",
-        "--js-runtimes", "node:/usr/bin/node",
-    ]
-    if os.path.exists(COOKIES):
-        args += ["--cookies", COOKIES]
-    return args
+def vtt_files(video_id: str, lang: str):
+    # ids / langs come from requests: never let them act as glob patterns
+    return sorted(glob.glob(f"{SUB_DIR}/{glob.escape(video_id)}*.{glob.escape(lang)}.vtt"))
 
 
 def yt_dlp_subs(video_id: str, lang: str, tries: int = 4):
     url = f"https://www.youtube.com/watch?v={video_id}"
     out_tpl = f"{SUB_DIR}/{video_id}.%(ext)s"
 
-    for f in glob.glob(f"{SUB_DIR}/{video_id}*.{lang}.vtt"):
-        try: os.remove(f)
-        except: pass
+    for f in vtt_files(video_id, lang):
         try:
             os.remove(f)
         except:
@@ -185,7 +265,6 @@ def yt_dlp_subs(video_id: str, lang: str, tries: int = 4):
     ]
 
     backoff = [5, 15, 45, 90]
-    last_out, last_err = "", ""
     last_out = ""
     last_err = ""
 
@@ -194,13 +273,12 @@ def yt_dlp_subs(video_id: str, lang: str, tries: int = 4):
         last_out, last_err = outlog, err
 
         if code == 0:
-            matches = sorted(glob.glob(f"{SUB_DIR}/{video_id}*.{lang}.vtt"))
+            matches = vtt_files(video_id, lang)
             if matches:
                 return True, outlog, err, matches[0]
             return False, outlog, err, None
 
         if is_429(err) and attempt < tries - 1:
-            time.sleep(backoff[min(attempt, len(backoff)-1)])
             time.sleep(backoff[min(attempt, len(backoff) - 1)])
             continue
 
@@ -226,15 +304,6 @@ def ensure_raw_mp4(video_id: str):
             "yt-dlp",
             "--force-overwrites",
             "--no-part",
-            "--retries", "10",
-            "--fragment-retries", "10",
-            "--concurrent-fragments", "1",
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
-            "--merge-output-format", "mp4",
-            "-o", out_tpl,
-            "--js-runtimes", "node",
-            url
-        ]
             "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best",
             "--merge-output-format", "mp4",
             "-o", out_tpl,
@@ -266,74 +335,8 @@ def ensure_raw_mp4(video_id: str):
     finally:
         release_lock(lock)
 
-def trim_and_retime_vtt_keep_inline(vtt_path: str, start_ms: int, end_ms: int, out_path: str) -> bool:
-    if not os.path.exists(vtt_path):
-        return False
-
-    lines = open(vtt_path, "r", encoding="utf-8", errors="ignore").read().splitlines()
-    out = ["WEBVTT", "Kind: captions", "Language: fr", ""]
-    wrote = 0
-    i = 0
-
-    while i < len(lines):
-        line = lines[i].strip()
-        if "-->" in line:
-            parts = [p.strip() for p in line.split("-->")]
-            if len(parts) >= 2:
-                s0 = parts[0]
-                e0 = parts[1].split()[0]
-                m1 = TS_RE.match(s0)
-                m2 = TS_RE.match(e0)
-                if m1 and m2:
-                    cue_s = hmsms_to_ms(*m1.groups())
-                    cue_e = hmsms_to_ms(*m2.groups())
-                    if cue_e > start_ms and cue_s < end_ms:
-                        new_s = max(cue_s, start_ms) - start_ms
-                        new_e = min(cue_e, end_ms) - start_ms
-                        out.append(f"{ms_to_hmsms(new_s)} --> {ms_to_hmsms(new_e)}")
-
-                        i += 1
-                        text_lines = []
-                        while i < len(lines) and lines[i].strip() != "":
-                            text_lines.append(lines[i])
-                            i += 1
-                        cue_text = "\n".join(text_lines).strip()
-
-                        def shift_inline(m):
-                            t = parse_hmsms(m.group(1))
-                            if t < start_ms: t = start_ms
-                            if t > end_ms: t = end_ms
-                            return f"<{ms_to_hmsms(t - start_ms)}>"
-
-                        cue_text = INLINE_TS_RE.sub(shift_inline, cue_text)
-                        out.append(cue_text.strip())
-                        out.append("")
-                        wrote += 1
-        i += 1
-
-    if wrote == 0:
-        return False
-
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(out).strip() + "\n")
-    return True
-
-def ass_time(ms: int) -> str:
-    cs = max(0, int(round(ms / 10)))
-    s = cs // 100
-    c = cs % 100
-    h = s // 3600
-    m = (s % 3600) // 60
-    sec = s % 60
-    return f"{h}:{m:02d}:{sec:02d}.{c:02d}"
-
-def escape_ass(t: str) -> str:
-    t = t.replace("{", "\\{").replace("}", "\\}")
-    t = t.replace("\n", "\\N")
-    return t
-
-def vtt_cues_with_inline(trimmed_vtt: str):
-    lines = open(trimmed_vtt, "r", encoding="utf-8", errors="ignore").read().splitlines()
+def parse_vtt_cues(vtt_text: str):
+    lines = vtt_text.splitlines()
     cues = []
     i = 0
     while i < len(lines):
@@ -348,8 +351,9 @@ def vtt_cues_with_inline(trimmed_vtt: str):
                     e_ms = parse_hmsms(e0)
                     i += 1
                     text_lines = []
-                    while i < len(lines) and lines[i].strip() != "":
-                        text_lines.append(lines[i])
+                    while i < len(lines) and lines[i] != "":
+                        if lines[i].strip():
+                            text_lines.append(lines[i])
                         i += 1
                     txt = "\n".join(text_lines).strip()
                     if txt:
@@ -373,7 +377,7 @@ def build_karaoke_from_inline_text(cue_text: str, cue_start_ms: int, cue_end_ms:
     for p in parts:
         if not p:
             continue
-        if p.startswith("<") and p.endswith(">") and len(p) == 15:
+        if INLINE_TS_RE.fullmatch(p):
             t_ms = parse_hmsms(p[1:-1])
             current_ts = max(cue_start_ms, min(t_ms, cue_end_ms))
         else:
@@ -398,25 +402,8 @@ def build_karaoke_from_inline_text(cue_text: str, cue_start_ms: int, cue_end_ms:
         out.append((w_s, w_e, w_txt))
     return out
 
-def make_ass_from_trimmed_vtt_inline(trimmed_vtt: str, out_ass: str):
-    cues = vtt_cues_with_inline(trimmed_vtt)
-    if not cues:
-        return False
-
-
 # ----------- SUBTITLE ENGINE (VTT -> ASS shifted) -----------
 
-_TIME_RE = re.compile(r"(\d{2}):(\d{2}):(\d{2})\.(\d{3})")
-
-
-def hmsms_to_ms(t: str) -> int:
-    m = _TIME_RE.match(t.strip())
-    if not m:
-        raise ValueError(f"Invalid time {t}")
-    hh, mm, ss, ms = map(int, m.groups())
-    return (((hh * 60 + mm) * 60) + ss) * 1000 + ms
-
-
 def ms_to_ass_time(ms: int) -> str:
     ms = max(0, int(ms))
     cs = ms // 10
@@ -466,7 +453,7 @@ def parse_word_timings(vtt_text_line: str):
     out = []
     for word, t in tokens:
         if t:
-            out.append((word, hmsms_to_ms(t)))
+            out.append((word, parse_hmsms(t)))
     return out
 
 
@@ -490,30 +477,11 @@ ScaledBorderAndShadow: yes
 
 [V4+ Styles]
 Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
-Style: Default,{FONT_NAME},{FONT_SIZE},{PRIMARY_COLOUR},{PRIMARY_COLOUR},{OUTLINE_COLOUR},{BACK_COLOUR},1,0,0,0,100,100,0,0,3,{OUTLINE},{SHADOW},2,70,70,{MARGIN_V},1
 Style: Default,DejaVu Sans,{font_size},&H00FFFFFF,&H00FFFFFF,&H00000000,&H{box_rgba_hex},0,0,0,0,100,100,0,0,3,3,0,2,90,90,150,1
 
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
-    lines = [header]
-
-    for cue_s, cue_e, cue_txt in cues:
-        words = build_karaoke_from_inline_text(cue_txt, cue_s, cue_e)
-        if not words:
-            continue
-
-        karaoke = []
-        for w_s, w_e, w_txt in words:
-            k = max(1, int(round((w_e - w_s) / 10)))  # centiseconds
-            karaoke.append(f"{{\\k{k}}}{escape_ass(w_txt)}")
-
-        ass_text = " ".join(karaoke)
-        lines.append(f"Dialogue: 0,{ass_time(cue_s)},{ass_time(cue_e)},Default,,0,0,0,,{ass_text}")
-
-    with open(out_ass, "w", encoding="utf-8") as f:
-        f.write("\n".join(lines) + "\n")
-    return True
 
     # Parse cues (simple parsing for WEBVTT)
     with open(vtt_path, "r", encoding="utf-8", errors="ignore") as f:
@@ -531,8 +499,8 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
             right = line.split("-->")[1].strip().split(" ")[0].strip()
 
             try:
-                start_ms = hmsms_to_ms(left)
-                end_ms = hmsms_to_ms(right)
+                start_ms = parse_hmsms(left)
+                end_ms = parse_hmsms(right)
             except:
                 i += 1
                 continue
@@ -599,43 +567,284 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     return ass_path
 
 
-@app.post("/transcript")
-def transcript():
+# ----------- JOBS / CALLBACKS (n8n webhooks) -----------
+
+def callback_session():
+    global _callback_session
+    with _callback_session_lock:
+        if _callback_session is None:
+            # read=0: a webhook that timed out may already have started the n8n
+            # workflow, resending would run it twice (receivers can also dedup on X-Job-Id)
+            retry = Retry(
+                total=CALLBACK_RETRIES,
+                read=0,
+                backoff_factor=CALLBACK_BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["POST"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=JOB_WORKERS, max_retries=retry)
+            s = requests.Session()
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            _callback_session = s
+        return _callback_session
+
+
+def post_callback(url: str, payload: dict):
+    """
+    POST the job result to n8n (Webhook node). Connections are pooled/kept alive,
+    retries (connect errors, 429, 5xx) are handled by the adapter.
+    Returns the HTTP status, or None if the receiver never answered.
+    """
+    headers = {"X-Job-Id": payload.get("jobId", "")}
+    try:
+        r = callback_session().post(url, json=payload, headers=headers, timeout=CALLBACK_TIMEOUT)
+        if r.status_code >= 400:
+            app.logger.warning("callback %s -> HTTP %s", url, r.status_code)
+        return r.status_code
+    except requests.RequestException as e:
+        app.logger.warning("callback %s failed: %s", url, e)
+        return None
+
+
+def execute(job_id: str, endpoint: str, handler, data: dict):
+    """
+    Run a handler with resource accounting: the child processes it launches
+    are attached to the result as "resources" and a job line goes to PROFILE_LOG.
+    """
+    meta = {"jobId": job_id, "endpoint": endpoint, "videoId": data.get("videoId")}
+    _job_ctx.procs = []
+    _job_ctx.meta = meta
+    t0 = time.monotonic()
+    try:
+        payload, status = handler(data)
+    except Exception as e:
+        payload, status = error_payload(e), 500
+    finally:
+        procs = _job_ctx.procs
+        _job_ctx.procs = None
+        _job_ctx.meta = {}
+
+    resources = profile_summary(procs, time.monotonic() - t0)
+    append_job_log(meta, bool(payload.get("ok")), payload.get("outputSec") if payload.get("ok") else None, resources)
+    return {**payload, "resources": resources}, status
+
+
+def run_job(job_id: str, endpoint: str, handler, data: dict, callback_url: str):
+    payload, status = execute(job_id, endpoint, handler, data)
+    post_callback(callback_url, {**payload, "jobId": job_id, "status": status})
+
+
+def check_video_id(data: dict):
+    video_id = data.get("videoId")
+    if not isinstance(video_id, str) or not VIDEO_ID_RE.match(video_id):
+        raise ValueError(f"invalid videoId: {video_id!r}")
+
+
+def transcript_input(data: dict):
+    check_video_id(data)
+    if data.get("format") == "structured":
+        transcript_query(data)
+
+
+def clip_input(data: dict):
+    check_video_id(data)
+    parse_hmsms(data.get("start", "00:00:30.000"))
+    dur = float(data.get("duration", 90))
+    if not 0 < dur <= 24 * 3600:
+        raise ValueError(f"invalid duration: {dur}")
+    int(data.get("fontSize", 34))
+    if not re.fullmatch(r"[0-9A-Fa-f]{8}", str(data.get("boxColor", "80800080"))):
+        raise ValueError("boxColor must be 8 hex digits (AABBGGRR)")
+
+
+def dispatch(handler, validate):
+    """
+    Without callbackUrl: run the handler inline, same behaviour as before.
+    With callbackUrl: answer 202 at once and POST the result when it is done.
+    Input is checked first either way, so a request that cannot succeed is a
+    synchronous 400 instead of a failed callback.
+    """
     data = request.get_json(force=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("body must be a JSON object")
+        validate(data)
+    except (TypeError, ValueError, OverflowError) as e:
+        return jsonify({"ok": False, "step": "input", "error": str(e)}), 400
+
+    callback_url = data.get("callbackUrl")
+    job_id = uuid.uuid4().hex
+    if not callback_url:
+        payload, status = execute(job_id, request.path, handler, data)
+        return jsonify(payload), status
+
+    if not str(callback_url).startswith(("http://", "https://")):
+        return jsonify({"ok": False, "step": "callback", "error": f"invalid callbackUrl: {callback_url}"}), 400
+
+    _jobs.submit(run_job, job_id, request.path, handler, data, callback_url)
+    return jsonify({"ok": True, "accepted": True, "jobId": job_id, "callbackUrl": callback_url}), 202
+
+
+# ----------- STRUCTURED TRANSCRIPT (dedup cues + word timings, columnar) -----------
+
+def clean_cue_text(t: str) -> str:
+    t = html.unescape(re.sub(r"<[^>]+>", "", t)).replace("\u200b", "")
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def is_rolling_vtt(cues) -> bool:
+    """Auto-captions: inline <hh:mm:ss.mmm> word timings or ~10ms transition cues."""
+    return any(INLINE_TS_RE.search(txt) or e_ms - s_ms <= 10 for s_ms, e_ms, txt in cues)
+
+
+def dedup_cues(vtt_text: str):
+    """
+    YouTube auto-captions roll: each line is shown once with inline word
+    timings, then repeated as plain text in a ~10ms transition cue and as the
+    first line of the next cue. Keep every spoken line once.
+    Manual subtitles keep one entry per cue (lines joined); back-to-back
+    identical cues are merged into one spanning both.
+    Returns [(start_ms, end_ms, text, [(w_start_ms, w_end_ms, word), ...]), ...]
+    """
+    cues = parse_vtt_cues(vtt_text)
+    out = []
+    if not is_rolling_vtt(cues):
+        for s_ms, e_ms, txt in cues:
+            text = clean_cue_text(txt)
+            if not text:
+                continue
+            if out and out[-1][2] == text and s_ms <= out[-1][1]:
+                out[-1] = (out[-1][0], max(out[-1][1], e_ms), text, ())
+                continue
+            out.append((s_ms, e_ms, text, ()))
+        return tuple(out)
+
+    prev_lines = set()
+    for s_ms, e_ms, txt in cues:
+        cue_lines = set()
+        for line in txt.split("\n"):
+            text = clean_cue_text(line)
+            if not text:
+                continue
+            cue_lines.add(text)
+            if text in prev_lines:
+                continue
+            words = []
+            if INLINE_TS_RE.search(line):
+                for w_s, w_e, w_txt in build_karaoke_from_inline_text(line, s_ms, e_ms) or []:
+                    w_txt = clean_cue_text(w_txt)
+                    if w_txt:
+                        words.append((w_s, w_e, w_txt))
+            out.append((s_ms, e_ms, text, tuple(words)))
+        prev_lines = cue_lines
+    return tuple(out)
+
+
+@lru_cache(maxsize=32)
+def load_cues(vtt_path: str, mtime_ns: int, size: int):
+    with open(vtt_path, "r", encoding="utf-8", errors="ignore") as f:
+        return dedup_cues(f.read())
+
+
+def cached_cues(vtt_path: str, st=None):
+    """Parsed cues of vtt_path; pass the caller's os.stat() so both describe the same file version."""
+    st = st or os.stat(vtt_path)
+    return load_cues(vtt_path, st.st_mtime_ns, st.st_size)
+
+
+def time_param(v):
+    """ "HH:MM:SS.mmm" (like /clip start) or seconds -> ms """
+    if v is None or v == "":
+        return None
+    if ":" in str(v):
+        return parse_hmsms(v)
+    return int(float(v) * 1000)
+
+
+def transcript_query(params):
+    """
+    from/to/offset/limit/words from a JSON body or request.args.
+    Raises ValueError on bad values (callers answer 400).
+    """
+    try:
+        from_ms = time_param(params.get("from")) or 0
+        to_ms = time_param(params.get("to"))
+        offset = max(0, int(params.get("offset", 0)))
+        limit = max(1, min(int(params.get("limit", TRANSCRIPT_PAGE_LIMIT)), TRANSCRIPT_MAX_PAGE_LIMIT))
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError(f"invalid from/to/offset/limit: {e}") from None
+    words = str(params.get("words", "1")).lower() not in ("0", "false", "no")
+    return from_ms, to_ms, offset, limit, words
+
+
+def transcript_page(cues, from_ms: int, to_ms, offset: int, limit: int, words: bool):
+    """
+    Columnar page of the cues overlapping [from, to).
+    words.cue is the index of the word's cue inside this page.
+    """
+    sel = [c for c in cues if c[1] > from_ms and (to_ms is None or c[0] < to_ms)]
+    page = sel[offset:offset + limit]
+    body = {
+        "format": "structured",
+        "total": len(sel),
+        "offset": offset,
+        "limit": limit,
+        "next": offset + limit if offset + limit < len(sel) else None,
+        "cues": {
+            "start": [c[0] for c in page],
+            "end": [c[1] for c in page],
+            "text": [c[2] for c in page],
+        },
+    }
+    if words:
+        cols = {"cue": [], "start": [], "end": [], "text": []}
+        for idx, c in enumerate(page):
+            for w_s, w_e, w_txt in c[3]:
+                cols["cue"].append(idx)
+                cols["start"].append(w_s)
+                cols["end"].append(w_e)
+                cols["text"].append(w_txt)
+        body["words"] = cols
+    return body
+
+
+def transcript_payload(video_id: str, lang: str, vtt_path: str, data: dict):
+    if data.get("format") == "structured":
+        cues = cached_cues(vtt_path)
+        page = transcript_page(cues, *transcript_query(data))
+        return {"ok": True, "videoId": video_id, "lang": lang, "vttPath": vtt_path, **page}
+    with open(vtt_path, "r", encoding="utf-8", errors="ignore") as f:
+        vtt = f.read()
+    return {"ok": True, "videoId": video_id, "lang": lang, "vttPath": vtt_path, "vtt": vtt}
+
+
+def transcript_job(data: dict):
     video_id = data["videoId"]
 
     ok_fr, out_fr, err_fr, vtt_fr = yt_dlp_subs(video_id, "fr", tries=4)
     if ok_fr and vtt_fr:
-        vtt = open(vtt_fr, "r", encoding="utf-8", errors="ignore").read()
-        with open(vtt_fr, "r", encoding="utf-8", errors="ignore") as f:
-            vtt = f.read()
-        return jsonify({"ok": True, "videoId": video_id, "lang": "fr", "vttPath": vtt_fr, "vtt": vtt})
+        return transcript_payload(video_id, "fr", vtt_fr, data), 200
 
     ok_en, out_en, err_en, vtt_en = yt_dlp_subs(video_id, "en", tries=4)
     if ok_en and vtt_en:
-        vtt = open(vtt_en, "r", encoding="utf-8", errors="ignore").read()
-        with open(vtt_en, "r", encoding="utf-8", errors="ignore") as f:
-            vtt = f.read()
-        return jsonify({"ok": True, "videoId": video_id, "lang": "en", "vttPath": vtt_en, "vtt": vtt})
+        return transcript_payload(video_id, "en", vtt_en, data), 200
 
-    return jsonify({
+    return {
         "ok": False,
         "step": "yt-dlp-subs",
         "error": "no vtt generated (rate-limit / subtitles disabled / blocked)",
         "stdout_fr": out_fr, "stderr_fr": err_fr,
         "stdout_en": out_en, "stderr_en": err_en
-    }), 500
+    }, 500
 
 
-@app.post("/clip")
-def clip():
-    data = request.get_json(force=True)
+def clip_job(data: dict):
     video_id = data["videoId"]
     start = data.get("start", "00:00:30.000")
     dur = float(data.get("duration", 90))
-    vtt_path = data.get("vttPath")
-    burn = bool(data.get("burnSubtitles", True))
-
     vtt_path = data.get("vttPath")
     burn = bool(data.get("burnSubtitles", True))
     karaoke = bool(data.get("karaoke", True))  # mot par mot
@@ -645,36 +854,19 @@ def clip():
 
     raw, yout, yerr = ensure_raw_mp4(video_id)
     if not raw:
-        return jsonify({"ok": False, "step": "yt-dlp", "error": "download did not create raw mp4", "stdout": yout or "", "stderr": yerr or ""}), 500
+        return {"ok": False, "step": "yt-dlp", "error": "download did not create raw mp4", "stdout": yout or "", "stderr": yerr or ""}, 500
 
     out_name = f"{video_id}_{uuid.uuid4().hex}_9x16.mp4"
     out = f"{FINAL_DIR}/{out_name}"
     n8n_out = f"{N8N_FINAL_DIR}/{out_name}"
 
-    vf = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
-
-    subs_tmp_vtt = None
-    subs_tmp_ass = None
-
-    if burn and vtt_path and os.path.exists(vtt_path):
-        start_ms = parse_hmsms(start)
-        end_ms = start_ms + int(dur * 1000)
-
-        subs_tmp_vtt = os.path.join(SUB_DIR, f"trim_{video_id}_{uuid.uuid4().hex}.vtt")
-        ok = trim_and_retime_vtt_keep_inline(vtt_path, start_ms, end_ms, subs_tmp_vtt)
-
-        if ok:
-            subs_tmp_ass = os.path.join(SUB_DIR, f"kara_{video_id}_{uuid.uuid4().hex}.ass")
-            ok_ass = make_ass_from_trimmed_vtt_inline(subs_tmp_vtt, subs_tmp_ass)
-            if ok_ass and os.path.exists(subs_tmp_ass):
-                safe_ass = subs_tmp_ass.replace("\\", "\\\\").replace("'", "\\'")
-                vf = vf + f",subtitles='{safe_ass}'"
     # Crop portrait
     vf = "scale=1080:1920:force_original_aspect_ratio=increase,crop=1080:1920"
 
     # Subtitles: we MUST shift them to clip start (otherwise it shows beginning)
+    ass_path = None
     if burn and vtt_path and os.path.exists(vtt_path):
-        clip_start_ms = hmsms_to_ms(start)
+        clip_start_ms = parse_hmsms(start)
         clip_end_ms = clip_start_ms + int(dur * 1000)
         ass_path = vtt_to_ass_shifted(vtt_path, clip_start_ms, clip_end_ms, karaoke, font_size, box)
         safe_ass = ass_path.replace("\\", "\\\\").replace("'", "\\'")
@@ -695,40 +887,335 @@ def clip():
     ]
     code, ffout, fferr = run(cmd)
 
-    for p in [subs_tmp_ass, subs_tmp_vtt]:
-        if p:
-            try: os.remove(p)
-            except: pass
-
-    if code != 0:
-        return jsonify({"ok": False, "step": "ffmpeg", "stdout": ffout, "stderr": fferr, "vf": vf}), 500
-
-    shutil.copyfile(out, n8n_out)
+    if ass_path:
+        try:
+            os.remove(ass_path)
+        except:
+            pass
 
-    code, ffout, fferr = run(cmd)
     if code != 0:
-        return jsonify({"ok": False, "step": "ffmpeg", "stdout": ffout, "stderr": fferr, "vf": vf}), 500
+        return {"ok": False, "step": "ffmpeg", "stdout": ffout, "stderr": fferr, "vf": vf}, 500
 
     try:
         shutil.copyfile(out, n8n_out)
     except Exception as e:
-        return jsonify({"ok": False, "step": "copy-to-n8n", "error": str(e), "src": out, "dst": n8n_out}), 500
+        return {"ok": False, "step": "copy-to-n8n", "error": str(e), "src": out, "dst": n8n_out}, 500
 
-    return jsonify({
+    return {
         "ok": True,
         "videoId": video_id,
         "raw": raw,
         "path": out,
         "n8nPath": f"/home/node/.n8n-files/final/{out_name}",
-        "subsBurned": bool(subs_tmp_ass is not None),
-        "vttPath": vtt_path if vtt_path else None
-    })
-
-        "subtitles": bool(burn and vtt_path and os.path.exists(vtt_path)),
+        "duration": dur,
+        "outputSec": ffmpeg_output_sec(fferr),
+        "vttPath": vtt_path if vtt_path else None,
+        "subtitles": ass_path is not None,
         "karaoke": karaoke,
         "fontSize": font_size,
         "boxColor": box
-    })
+    }, 200
+
+
+# ----------- BATCH TRANSCRIPTS (yt-dlp API, one session per worker) -----------
+
+class YdlLog:
+    """Collects yt-dlp API messages so is_429() and stdout/stderr work like with the CLI."""
+
+    def __init__(self):
+        self.out = []
+        self.err = []
+
+    def debug(self, msg):
+        self.out.append(msg)
+
+    def info(self, msg):
+        self.out.append(msg)
+
+    def warning(self, msg):
+        self.err.append(msg)
+
+    def error(self, msg):
+        self.err.append(msg)
+
+    def take(self):
+        out, err = "\n".join(self.out), "\n".join(self.err)
+        self.out, self.err = [], []
+        return out, err
+
+
+def ydl_session(langs: list):
+    argv = [
+        "--skip-download",
+        "--write-subs",
+        "--write-auto-subs",
+        "--sub-format", "vtt",
+        "--sub-langs", ",".join(langs),
+        "--output", f"{SUB_DIR}/%(id)s.%(ext)s",
+        *yt_dlp_common_args(),
+    ]
+    log = YdlLog()
+    # ignoreerrors=False: a failing video raises, like a non-zero CLI exit code
+    opts = {**yt_dlp.parse_options(argv).ydl_opts, "logger": log, "noprogress": True, "ignoreerrors": False}
+    return yt_dlp.YoutubeDL(opts), log
+
+
+def flat_video_ids(info: dict):
+    """Video ids of a flat extraction, walking nested playlists (channel tabs)."""
+    for e in info.get("entries") or []:
+        if not e:
+            continue
+        if e.get("entries") is not None:
+            yield from flat_video_ids(e)
+        elif e.get("_type") == "url" and e.get("ie_key") == "Youtube" and e.get("id"):
+            yield e["id"]
+
+
+def playlist_video_ids(url: str, limit=None):
+    """
+    Expand a playlist / channel tab URL (e.g. https://www.youtube.com/@name/videos)
+    into video ids, without resolving each video.
+    Raises ValueError when the URL gives no video (e.g. an unresolved channel root).
+    """
+    opts = {
+        **yt_dlp.parse_options(yt_dlp_common_args()).ydl_opts,
+        "extract_flat": "in_playlist",
+        "logger": YdlLog(),
+    }
+    if limit:
+        opts["playlistend"] = int(limit)
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    if info.get("entries") is None:
+        ids = [info["id"]] if info.get("_type", "video") == "video" and info.get("id") else []
+    else:
+        ids = list(flat_video_ids(info))
+    ids = [v for v in ids if VIDEO_ID_RE.match(v)]
+    if not ids:
+        raise ValueError(f"no videos found for {url} (for a channel use its /videos, /shorts or /streams tab)")
+    return ids[:int(limit)] if limit else ids
+
+
+def ydl_video_subs(ydl, log: YdlLog, video_id: str, langs: list, params: dict, tries: int = 4):
+    """
+    Same as yt_dlp_subs() + transcript_job() for one video, but through an
+    already open YoutubeDL session (no process / extractor startup per video).
+    """
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    for lang in langs:
+        for f in vtt_files(video_id, lang):
+            try:
+                os.remove(f)
+            except:
+                pass
+
+    backoff = [5, 15, 45, 90]
+    out = ""
+    err = ""
+
+    for attempt in range(tries):
+        try:
+            ydl.download([url])
+            failed = False
+        except yt_dlp.utils.DownloadError:
+            failed = True
+        out, err = log.take()
+
+        if not failed:
+            for lang in langs:
+                matches = vtt_files(video_id, lang)
+                if matches:
+                    return transcript_payload(video_id, lang, matches[0], params)
+            break
+
+        if is_429(err) and attempt < tries - 1:
+            time.sleep(backoff[min(attempt, len(backoff) - 1)])
+            continue
+        break
+
+    return {
+        "ok": False,
+        "videoId": video_id,
+        "step": "yt-dlp-subs",
+        "error": "no vtt generated (rate-limit / subtitles disabled / blocked)",
+        "stdout": out, "stderr": err
+    }
+
+
+def transcript_batch_results(batch_id: str, video_ids: list, langs: list, concurrency: int, params: dict):
+    """
+    NDJSON generator: one line per video as soon as it is done, then a summary line.
+    Each worker thread keeps its own YoutubeDL for the whole batch.
+    """
+    local = threading.local()
+    sessions = []
+    threads = []
+    meta = {"jobId": batch_id, "endpoint": "/transcript/batch", "videoId": None}
+
+    def work(video_id):
+        # in-process work: account the worker thread (RUSAGE_THREAD). Helpers yt-dlp
+        # spawns itself (node JS runtime) are not attributed to the video.
+        ru0 = resource.getrusage(resource.RUSAGE_THREAD)
+        t0 = time.monotonic()
+        try:
+            if not hasattr(local, "ydl"):
+                local.ydl, local.log = ydl_session(langs)
+                sessions.append(local.ydl)
+            res = ydl_video_subs(local.ydl, local.log, video_id, langs, params)
+        except Exception as e:
+            res = {**error_payload(e), "videoId": video_id}
+        ru1 = resource.getrusage(resource.RUSAGE_THREAD)
+
+        entry = {
+            "kind": "thread",
+            "tool": "yt-dlp-api",
+            "returncode": 0 if res.get("ok") else 1,
+            "wallSec": round(time.monotonic() - t0, 3),
+            "userSec": round(ru1.ru_utime - ru0.ru_utime, 3),
+            "sysSec": round(ru1.ru_stime - ru0.ru_stime, 3),
+            "inBlocks": ru1.ru_inblock - ru0.ru_inblock,
+            "outBlocks": ru1.ru_oublock - ru0.ru_oublock,
+        }
+        threads.append(entry)
+        append_profile_log({"ts": time.time(), **meta, "videoId": video_id, **entry})
+        return {**res, "resources": profile_summary([entry], entry["wallSec"])}
+
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    t0 = time.monotonic()
+    n_ok = 0
+    try:
+        futures = {pool.submit(work, v): v for v in video_ids}
+        for fut in as_completed(futures):
+            try:
+                res = fut.result()
+            except Exception as e:
+                res = {**error_payload(e), "videoId": futures[fut]}
+            n_ok += bool(res.get("ok"))
+            yield json.dumps(res, ensure_ascii=False) + "\n"
+
+        resources = profile_summary(list(threads), time.monotonic() - t0)
+        yield json.dumps({
+            "done": True,
+            "batchId": batch_id,
+            "count": len(video_ids),
+            "succeeded": n_ok,
+            "failed": len(video_ids) - n_ok,
+            "resources": {k: v for k, v in resources.items() if k != "processes"},
+        }) + "\n"
+    finally:
+        # client gone or batch finished: drop what has not started yet
+        pool.shutdown(wait=True, cancel_futures=True)
+        for ydl in sessions:
+            ydl.close()
+        append_job_log(meta, n_ok == len(video_ids), None, profile_summary(list(threads), time.monotonic() - t0))
+
+
+@app.post("/transcript")
+def transcript():
+    return dispatch(transcript_job, transcript_input)
+
+
+@app.get("/transcript/<video_id>")
+def transcript_structured(video_id):
+    """
+    Structured view of a VTT already fetched by /transcript or /transcript/batch.
+    Query: lang, from, to (HH:MM:SS.mmm or seconds), offset, limit, words=0|1.
+    Supports If-None-Match (ETag) and gzip.
+    """
+    if not VIDEO_ID_RE.match(video_id):
+        return jsonify({"ok": False, "step": "input", "error": f"invalid videoId: {video_id}"}), 400
+
+    langs = [request.args["lang"]] if request.args.get("lang") else TRANSCRIPT_LANGS
+    vtt_path, lang = None, None
+    for l in langs:
+        matches = vtt_files(video_id, l)
+        if matches:
+            vtt_path, lang = matches[0], l
+            break
+    if not vtt_path:
+        return jsonify({"ok": False, "step": "cache", "error": "no vtt for this video, call /transcript first", "videoId": video_id}), 404
+
+    try:
+        query = transcript_query(request.args)
+    except ValueError as e:
+        return jsonify({"ok": False, "step": "input", "error": str(e)}), 400
+    gz = request.accept_encodings["gzip"] > 0
+    st = os.stat(vtt_path)
+    etag = hashlib.sha1(f"{vtt_path}:{st.st_mtime_ns}:{st.st_size}:{query}".encode("utf-8")).hexdigest()
+    if gz:
+        etag += "-gz"
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        cues = cached_cues(vtt_path, st)
+        payload = {"ok": True, "videoId": video_id, "lang": lang, "vttPath": vtt_path, **transcript_page(cues, *query)}
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if gz:
+            body = gzip.compress(body, compresslevel=6)
+        resp = Response(body, mimetype="application/json")
+        if gz:
+            resp.headers["Content-Encoding"] = "gzip"
+
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+@app.post("/transcript/batch")
+def transcript_batch():
+    """
+    Body: {"videoIds": [...]} and/or {"url": playlist/channel URL, "limit": N},
+    optional "langs" (default fr, en), "concurrency" and the /transcript
+    "format": "structured" options.
+    Streams application/x-ndjson, one /transcript-like object per video,
+    then a summary line {"done": true, "succeeded": n, "failed": m, ...}.
+    """
+    data = request.get_json(force=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("body must be a JSON object")
+        video_ids = data.get("videoIds") or []
+        langs = data.get("langs") or TRANSCRIPT_LANGS
+        if not isinstance(video_ids, list) or not all(isinstance(v, str) and VIDEO_ID_RE.match(v) for v in video_ids):
+            raise ValueError("videoIds must be a list of YouTube video ids")
+        if not isinstance(langs, list) or not all(isinstance(l, str) and LANG_RE.match(l) for l in langs):
+            raise ValueError("langs must be a list of language codes like \"fr\" or \"en-US\"")
+        concurrency = max(1, min(int(data.get("concurrency", BATCH_CONCURRENCY)), BATCH_MAX_CONCURRENCY))
+        limit = int(data["limit"]) if data.get("limit") is not None else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be >= 1")
+        if data.get("format") == "structured":
+            transcript_query(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"ok": False, "step": "input", "error": str(e)}), 400
+
+    video_ids = list(video_ids)
+    if data.get("url"):
+        try:
+            video_ids += playlist_video_ids(data["url"], limit)
+        except ValueError as e:
+            return jsonify({"ok": False, "step": "input", "error": str(e)}), 400
+        except yt_dlp.utils.DownloadError as e:
+            return jsonify({"ok": False, "step": "yt-dlp-playlist", "error": str(e)}), 500
+
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        return jsonify({"ok": False, "step": "input", "error": "no videoIds / empty playlist"}), 400
+
+    batch_id = uuid.uuid4().hex
+    return Response(
+        transcript_batch_results(batch_id, video_ids, langs, concurrency, data),
+        mimetype="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id},
+    )
+
+
+@app.post("/clip")
+def clip():
+    return dispatch(clip_job, clip_input)
 
 
 if __name__ == "__main__":
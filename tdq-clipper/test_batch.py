@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+import app
+
+
+class FakeYdl:
+    def close(self):
+        pass
+
+
+def fake_video_subs(ydl, log, video_id, langs, params, tries=4):
+    if video_id == "boom":
+        raise RuntimeError("extractor crashed")
+    if video_id == "nosubs":
+        return {"ok": False, "videoId": video_id, "step": "yt-dlp-subs", "error": "no vtt generated"}
+    return {"ok": True, "videoId": video_id, "lang": langs[0], "vttPath": f"/data/subs/{video_id}.{langs[0]}.vtt", "vtt": "WEBVTT\n"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "ydl_session", lambda langs: (FakeYdl(), app.YdlLog()))
+    monkeypatch.setattr(app, "ydl_video_subs", fake_video_subs)
+    return app.app.test_client()
+
+
+def ndjson(r):
+    return [json.loads(line) for line in r.data.decode("utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("body", [
+    ["x"],
+    {"videoIds": ["*"]},
+    {"videoIds": ["../etc"]},
+    {"videoIds": "abc123"},
+    {"videoIds": ["abc123"], "langs": [1]},
+    {"videoIds": ["abc123"], "langs": ["fr*"]},
+    {"videoIds": ["abc123"], "limit": 0},
+    {"videoIds": ["abc123"], "limit": "many"},
+    {"videoIds": ["abc123"], "concurrency": "x"},
+    {},
+])
+def test_bad_input_is_400(client, body):
+    r = client.post("/transcript/batch", json=body)
+    assert r.status_code == 400
+    assert r.get_json()["step"] == "input"
+
+
+def test_one_line_per_video_then_summary(client):
+    r = client.post("/transcript/batch", json={
+        "videoIds": ["vid1", "boom", "vid2", "nosubs", "vid1"],
+        "concurrency": 2,
+    })
+    assert r.status_code == 200
+    assert r.mimetype == "application/x-ndjson"
+
+    lines = ndjson(r)
+    videos, summary = lines[:-1], lines[-1]
+
+    assert sorted(l["videoId"] for l in videos) == ["boom", "nosubs", "vid1", "vid2"]
+    by_id = {l["videoId"]: l for l in videos}
+    assert by_id["vid1"]["ok"] is True
+    assert by_id["boom"]["ok"] is False
+    assert by_id["boom"]["error"] == "extractor crashed"
+    assert by_id["nosubs"]["ok"] is False
+    assert all("resources" in l and "done" not in l for l in videos)
+
+    assert summary["done"] is True
+    assert summary["batchId"] == r.headers["X-Batch-Id"]
+    assert (summary["count"], summary["succeeded"], summary["failed"]) == (4, 2, 2)
+    assert "ok" not in summary
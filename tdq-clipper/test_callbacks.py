@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+RESULT = {"ok": True, "videoId": "abc123", "lang": "fr", "vttPath": "/data/subs/abc123.fr.vtt", "vtt": "WEBVTT\n"}
+
+
+class Receiver:
+    """Stand-in for the n8n Webhook node: answers with the scripted statuses in order."""
+
+    def __init__(self, statuses, delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = []
+        self.done = threading.Event()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.calls.append((dict(self.headers), json.loads(body)))
+                time.sleep(receiver.delay)
+                status = receiver.statuses.pop(0) if receiver.statuses else 200
+                try:
+                    self.send_response(status)
+                    self.end_headers()
+                except OSError:
+                    pass  # client already gave up (read timeout)
+                if status < 400:
+                    receiver.done.set()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, "transcript_job", lambda data: (dict(RESULT), 200))
+    monkeypatch.setattr(app, "CALLBACK_BACKOFF", 0)
+    monkeypatch.setattr(app, "_callback_session", None)
+    yield app.app.test_client()
+    monkeypatch.setattr(app, "_callback_session", None)
+
+
+def test_callback_delivers_sync_shape_with_job_id(client):
+    receiver = Receiver([200])
+    try:
+        sync = client.post("/transcript", json={"videoId": "abc123"}).get_json()
+
+        r = client.post("/transcript", json={"videoId": "abc123", "callbackUrl": receiver.url})
+        assert r.status_code == 202
+        job_id = r.get_json()["jobId"]
+
+        assert receiver.done.wait(5)
+        headers, body = receiver.calls[0]
+        assert headers["X-Job-Id"] == job_id
+        assert body["jobId"] == job_id
+        assert body["status"] == 200
+        assert set(body) == set(sync) | {"jobId", "status"}
+        assert {k: body[k] for k in RESULT} == RESULT
+    finally:
+        receiver.close()
+
+
+def test_callback_retries_503(client):
+    receiver = Receiver([503, 200])
+    try:
+        r = client.post("/transcript", json={"videoId": "abc123", "callbackUrl": receiver.url})
+        assert r.status_code == 202
+        assert receiver.done.wait(5)
+        assert len(receiver.calls) == 2
+    finally:
+        receiver.close()
+
+
+def test_callback_read_timeout_is_not_resent(client, monkeypatch):
+    monkeypatch.setattr(app, "CALLBACK_TIMEOUT", (2, 0.3))
+    receiver = Receiver([200], delay=1.0)
+    try:
+        r = client.post("/transcript", json={"videoId": "abc123", "callbackUrl": receiver.url})
+        assert r.status_code == 202
+        assert receiver.done.wait(5)
+        time.sleep(1.5)  # a resend would have arrived by now
+        assert len(receiver.calls) == 1
+    finally:
+        receiver.close()
+
+
+def test_bad_input_is_rejected_before_202(client):
+    for body in (
+        {"callbackUrl": "http://127.0.0.1:1/hook"},
+        {"videoId": "a*b", "callbackUrl": "http://127.0.0.1:1/hook"},
+    ):
+        r = client.post("/transcript", json=body)
+        assert r.status_code == 400
+        assert r.get_json()["step"] == "input"
+
+    for extra in ({"duration": "x"}, {"fontSize": "big"}, {"start": "30"}, {"duration": 0}):
+        r = client.post("/clip", json={"videoId": "abc123", "callbackUrl": "http://127.0.0.1:1/hook", **extra})
+        assert r.status_code == 400
+        assert r.get_json()["step"] == "input"
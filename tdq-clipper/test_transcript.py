@@ -0,0 +1,129 @@
+import os
+
+import app
+
+# Rolling YouTube auto-captions: each block opens with a line holding a single
+# space, the spoken line carries inline word timings, then a 10ms transition
+# cue and the next cue repeat it as plain text.
+AUTO_VTT = "\n".join([
+    "WEBVTT",
+    "Kind: captions",
+    "Language: fr",
+    "",
+    "00:00:00.080 --> 00:00:02.869 align:start position:0%",
+    " ",
+    "bonjour<00:00:00.480><c> et</c><00:00:00.799><c> bienvenue</c>",
+    "",
+    "00:00:02.869 --> 00:00:02.879 align:start position:0%",
+    "bonjour et bienvenue",
+    " ",
+    "",
+    "00:00:02.879 --> 00:00:05.749 align:start position:0%",
+    "bonjour et bienvenue",
+    "dans<00:00:03.199><c> cette</c><00:00:03.520><c> vidéo</c><00:00:04.000><c> rock</c>"
+    "<00:00:04.240><c> &amp;</c><00:00:04.480><c> roll\u200b</c>",
+    "",
+    "00:00:05.749 --> 00:00:05.759 align:start position:0%",
+    "dans cette vidéo rock &amp; roll",
+    " ",
+    "",
+    "00:00:05.759 --> 00:00:08.000 align:start position:0%",
+    "dans cette vidéo rock &amp; roll",
+    "on<00:00:06.000><c> commence</c>",
+    "",
+])
+
+
+def test_dedup_cues_keeps_first_line_with_word_timings():
+    cues = app.dedup_cues(AUTO_VTT)
+
+    assert [(c[0], c[1], c[2]) for c in cues] == [
+        (80, 2869, "bonjour et bienvenue"),
+        (2879, 5749, "dans cette vidéo rock & roll"),
+        (5759, 8000, "on commence"),
+    ]
+    assert cues[0][3] == ((80, 480, "bonjour"), (480, 799, "et"), (799, 2869, "bienvenue"))
+
+
+def test_dedup_cues_words_are_normalised_like_text():
+    cues = app.dedup_cues(AUTO_VTT)
+
+    words = [w[2] for w in cues[1][3]]
+    assert words == ["dans", "cette", "vidéo", "rock", "&", "roll"]
+    assert " ".join(words) == cues[1][2]
+
+
+def test_time_range_query():
+    page = app.transcript_page(app.dedup_cues(AUTO_VTT), *app.transcript_query({"from": "0", "to": "2.5"}))
+
+    assert page["total"] == 1
+    assert page["cues"]["text"] == ["bonjour et bienvenue"]
+    assert page["words"]["cue"] == [0, 0, 0]
+
+
+def test_structured_get_bad_query_is_400():
+    video_id = "testVtt0001"
+    path = os.path.join(app.SUB_DIR, f"{video_id}.fr.vtt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(AUTO_VTT)
+    try:
+        c = app.app.test_client()
+        for qs in ("from=x", "from=1:2", "limit=abc"):
+            r = c.get(f"/transcript/{video_id}?{qs}")
+            assert r.status_code == 400
+            assert r.get_json()["step"] == "input"
+
+        r = c.get(f"/transcript/{video_id}?from=00:00:00.000&to=2.5")
+        assert r.status_code == 200
+        assert r.get_json()["cues"]["start"] == [80]
+    finally:
+        os.remove(path)
+
+
+MANUAL_VTT = "\n".join([
+    "WEBVTT",
+    "",
+    "00:00:01.000 --> 00:00:03.000",
+    "Hello there,",
+    "how are you?",
+    "",
+    "00:00:03.000 --> 00:00:05.000",
+    "[Music]",
+    "",
+    "00:00:05.000 --> 00:00:07.000",
+    "[Music]",
+    "",
+    "00:00:07.500 --> 00:00:09.000",
+    "Fine, thanks.",
+    "",
+])
+
+
+def test_manual_subtitles_keep_one_entry_per_cue():
+    cues = app.dedup_cues(MANUAL_VTT)
+
+    assert cues == (
+        (1000, 3000, "Hello there, how are you?", ()),
+        (3000, 7000, "[Music]", ()),
+        (7500, 9000, "Fine, thanks.", ()),
+    )
+
+    page = app.transcript_page(cues, *app.transcript_query({"from": "5.5", "to": "6"}))
+    assert page["cues"]["text"] == ["[Music]"]
+
+
+def test_structured_get_gzip_respects_quality():
+    video_id = "testVtt0002"
+    path = os.path.join(app.SUB_DIR, f"{video_id}.fr.vtt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(MANUAL_VTT)
+    try:
+        c = app.app.test_client()
+        r = c.get(f"/transcript/{video_id}", headers={"Accept-Encoding": "gzip;q=0"})
+        assert "Content-Encoding" not in r.headers
+        assert r.get_json()["total"] == 3
+
+        r = c.get(f"/transcript/{video_id}", headers={"Accept-Encoding": "gzip"})
+        assert r.headers["Content-Encoding"] == "gzip"
+    finally:
+        os.remove(path)